@@ -0,0 +1,140 @@
+"""
+Asynchronous, batched writer for knowledge_access_logs.
+
+Search handlers enqueue a record and return immediately; a background task
+drains the queue and writes whole batches with COPY, so audit logging no
+longer adds a write round trip to the read path.
+"""
+
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("knowledge_gateway.access_log")
+
+ACCESS_LOG_QUEUE_SIZE = int(os.environ.get("ACCESS_LOG_QUEUE_SIZE", "10000"))
+ACCESS_LOG_BATCH_SIZE = int(os.environ.get("ACCESS_LOG_BATCH_SIZE", "500"))
+ACCESS_LOG_FLUSH_MS = int(os.environ.get("ACCESS_LOG_FLUSH_MS", "250"))
+
+COLUMNS = [
+    "request_id", "guest_id", "query", "source_ids", "result_count",
+    "quality", "latency_ms", "cached", "created_at",
+]
+
+_STOP = object()
+
+
+class AccessLogWriter:
+    """
+    Bounded queue + background COPY flusher.
+
+    When the queue is full (database slow or down) new records are dropped
+    and counted rather than blocking searches. stop() drains whatever is
+    still queued, so a clean shutdown loses nothing.
+    """
+
+    def __init__(
+        self,
+        pool,
+        queue_size: int = ACCESS_LOG_QUEUE_SIZE,
+        batch_size: int = ACCESS_LOG_BATCH_SIZE,
+        flush_ms: int = ACCESS_LOG_FLUSH_MS,
+    ):
+        self.pool = pool
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        self._task: Optional[asyncio.Task] = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def log(
+        self,
+        request_id: str,
+        guest_id: str,
+        query: str,
+        source_ids: List,
+        result_count: int,
+        quality: Optional[str] = None,
+        latency_ms: Optional[float] = None,
+        cached: Optional[bool] = None,
+    ) -> None:
+        record = (
+            request_id, guest_id, query, source_ids, result_count,
+            quality, latency_ms, cached, datetime.now(timezone.utc),
+        )
+        try:
+            self.queue.put_nowait(record)
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            record = await self.queue.get()
+            if record is _STOP:
+                return
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            stopping = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is _STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[tuple]) -> None:
+        if not batch:
+            return
+        try:
+            async with self.pool.acquire() as conn:
+                await conn.copy_records_to_table("knowledge_access_logs", records=batch, columns=COLUMNS)
+            self.written += len(batch)
+            self.flushes += 1
+        except Exception:
+            self.failed += len(batch)
+            logger.exception("Failed to write %d access log records", len(batch))
+
+    async def stop(self) -> None:
+        """Flush everything still queued and stop the background task"""
+        if self._task is not None:
+            # Queued behind every pending record, so nothing is cut off mid-batch
+            await self.queue.put(_STOP)
+            await self._task
+            self._task = None
+        remaining = []
+        while not self.queue.empty():
+            record = self.queue.get_nowait()
+            if record is not _STOP:
+                remaining.append(record)
+        for i in range(0, len(remaining), self.batch_size):
+            await self._flush(remaining[i:i + self.batch_size])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "flushes": self.flushes,
+        }
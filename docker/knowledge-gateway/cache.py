@@ -0,0 +1,355 @@
+"""
+In-process caches for the knowledge gateway hot path.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+import numpy as np
+
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+QUERY_EMBEDDING_CACHE_TTL = float(os.environ.get("QUERY_EMBEDDING_CACHE_TTL", "3600"))
+QUERY_EMBEDDING_CACHE_SHARED = os.environ.get("QUERY_EMBEDDING_CACHE_SHARED", "false").lower() in {"1", "true", "yes", "on"}
+# Expired shared rows are deleted from _shared_set at most this often per process, in bounded batches
+QUERY_EMBEDDING_CACHE_PURGE_SECONDS = float(os.environ.get("QUERY_EMBEDDING_CACHE_PURGE_SECONDS", "300"))
+QUERY_EMBEDDING_CACHE_PURGE_BATCH = 1000
+
+# Semantic answer cache: total entries (0 disables), entries per scope, cosine threshold
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "2048"))
+SEMANTIC_CACHE_SCOPE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SCOPE_SIZE", "256"))
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "900"))
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive cache key for a query"""
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+
+    The in-process LRU tier answers repeat queries without any I/O. The
+    optional shared tier (query_embedding_cache table) lets gateway
+    replicas reuse each other's embeddings, which matters when the embedder
+    is a paid remote API. Keys include the embedder name so switching model
+    or dimensions never serves stale vectors.
+    """
+
+    def __init__(
+        self,
+        embedder,
+        maxsize: int = QUERY_EMBEDDING_CACHE_SIZE,
+        ttl: float = QUERY_EMBEDDING_CACHE_TTL,
+        shared: bool = QUERY_EMBEDDING_CACHE_SHARED,
+    ):
+        self.embedder = embedder
+        self.memory = TTLCache(maxsize, ttl)
+        self.shared = shared
+        self.pool = None
+        self.shared_hits = 0
+        self.shared_misses = 0
+        self.shared_purged = 0
+        self._next_purge = 0.0
+
+    def attach_pool(self, pool) -> None:
+        self.pool = pool
+
+    async def embed_query(self, query: str) -> List[float]:
+        return (await self.embed_queries([query]))[0]
+
+    async def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Embed many queries, sending only cache misses to the embedder in one call"""
+        norms = [normalize_query(q) for q in queries]
+        found: Dict[str, List[float]] = {}
+        missing: Dict[str, str] = {}
+        for query, query_norm in zip(queries, norms):
+            if query_norm in found or query_norm in missing:
+                continue
+            vec = self.memory.get((self.embedder.name, query_norm))
+            if vec is not None:
+                found[query_norm] = vec
+            else:
+                # Embed the first raw spelling seen for each normalized key
+                missing[query_norm] = query
+
+        use_shared = self.shared and self.pool is not None
+        if missing and use_shared:
+            shared = await self._shared_get(self.embedder.name, list(missing))
+            self.shared_hits += len(shared)
+            self.shared_misses += len(missing) - len(shared)
+            for query_norm, vec in shared.items():
+                self.memory.set((self.embedder.name, query_norm), vec)
+                found[query_norm] = vec
+                del missing[query_norm]
+
+        if missing:
+            fresh = dict(zip(missing, await self.embedder.embed(list(missing.values()))))
+            for query_norm, vec in fresh.items():
+                self.memory.set((self.embedder.name, query_norm), vec)
+            found.update(fresh)
+            if use_shared:
+                await self._shared_set(self.embedder.name, fresh)
+
+        return [found[n] for n in norms]
+
+    async def _shared_get(self, embedder_name: str, query_norms: List[str]) -> Dict[str, List[float]]:
+        async with self.pool.acquire() as conn:
+            rows = await conn.fetch(
+                """
+                SELECT query_norm, embedding FROM query_embedding_cache
+                WHERE embedder = $1 AND query_norm = ANY($2::text[])
+                AND created_at > now() - make_interval(secs => $3)
+                """,
+                embedder_name, query_norms, self.memory.ttl
+            )
+        return {r["query_norm"]: r["embedding"] for r in rows}
+
+    async def _shared_set(self, embedder_name: str, vecs: Dict[str, List[float]]) -> None:
+        async with self.pool.acquire() as conn:
+            await conn.executemany(
+                """
+                INSERT INTO query_embedding_cache (embedder, query_norm, embedding, created_at)
+                VALUES ($1, $2, $3, now())
+                ON CONFLICT (embedder, query_norm)
+                DO UPDATE SET embedding = $3, created_at = now()
+                """,
+                [(embedder_name, query_norm, vec) for query_norm, vec in vecs.items()]
+            )
+            if time.monotonic() >= self._next_purge:
+                self._next_purge = time.monotonic() + QUERY_EMBEDDING_CACHE_PURGE_SECONDS
+                await self._shared_purge(conn)
+
+    async def _shared_purge(self, conn) -> None:
+        """Delete a batch of rows past the TTL; _shared_get already ignores them"""
+        status = await conn.execute(
+            """
+            DELETE FROM query_embedding_cache
+            WHERE ctid = ANY(ARRAY(
+                SELECT ctid FROM query_embedding_cache
+                WHERE created_at < now() - make_interval(secs => $1)
+                LIMIT $2
+            ))
+            """,
+            self.memory.ttl, QUERY_EMBEDDING_CACHE_PURGE_BATCH
+        )
+        self.shared_purged += int(status.split()[-1])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "embedder": self.embedder.name,
+            "memory": self.memory.stats(),
+            "shared": {
+                "enabled": self.shared,
+                "hits": self.shared_hits,
+                "misses": self.shared_misses,
+                "purged": self.shared_purged,
+            },
+        }
+
+
+class _SemanticScope:
+    """Entries of one scope plus a lazily stacked matrix of their query vectors"""
+
+    def __init__(self, connection_ids: Iterable[str]):
+        self.connection_ids = tuple(connection_ids)
+        # entry id -> (expires_at, unit vector, value), least recently used first
+        self.entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._matrix = None
+
+    def matrix(self):
+        if self._matrix is None and self.entries:
+            ids = list(self.entries)
+            self._matrix = (ids, np.stack([self.entries[i][1] for i in ids]))
+        return self._matrix
+
+    def add(self, entry_id: int, item: tuple) -> None:
+        self.entries[entry_id] = item
+        self._matrix = None
+
+    def remove(self, entry_id: int) -> None:
+        del self.entries[entry_id]
+        self._matrix = None
+
+
+class SemanticCache:
+    """
+    Result sets reused across paraphrased queries.
+
+    A scope is everything except the query text that determines a result
+    set: the guest's (connection_id, generation) pairs and the search
+    parameters. Within a scope, a lookup returns the stored result of the
+    most similar earlier query if its cosine similarity reaches the
+    threshold, so one matrix-vector product replaces a database search.
+    A sync or disconnect bumps the generation, which makes old scopes
+    unreachable; invalidate_connection also frees them at once.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = SEMANTIC_CACHE_SIZE,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL,
+        scope_maxsize: int = SEMANTIC_CACHE_SCOPE_SIZE,
+    ):
+        self.maxsize = maxsize
+        self.threshold = threshold
+        self.ttl = ttl
+        self.scope_maxsize = scope_maxsize
+        # Least recently used scope first
+        self._scopes: "OrderedDict[Hashable, _SemanticScope]" = OrderedDict()
+        self._by_connection: Dict[str, Set[Hashable]] = {}
+        self._next_id = 0
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    @staticmethod
+    def _unit(vector) -> np.ndarray:
+        v = np.asarray(vector, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def get(self, scope: Hashable, vector) -> Optional[Any]:
+        bucket = self._scopes.get(scope)
+        if bucket is None:
+            self.misses += 1
+            return None
+        now = time.monotonic()
+        for entry_id in [i for i, item in bucket.entries.items() if item[0] < now]:
+            self._remove_entry(scope, bucket, entry_id)
+        stacked = bucket.matrix()
+        if stacked is None:
+            self.misses += 1
+            return None
+        ids, matrix = stacked
+        similarity = matrix @ self._unit(vector)
+        best = int(np.argmax(similarity))
+        if similarity[best] < self.threshold:
+            self.misses += 1
+            return None
+        entry_id = ids[best]
+        bucket.entries.move_to_end(entry_id)
+        self._scopes.move_to_end(scope)
+        self.hits += 1
+        return bucket.entries[entry_id][2]
+
+    def set(self, scope: Hashable, vector, value: Any, connection_ids: Iterable) -> None:
+        if not self.enabled:
+            return
+        bucket = self._scopes.get(scope)
+        if bucket is None:
+            bucket = self._scopes[scope] = _SemanticScope(str(c) for c in connection_ids)
+            for connection_id in bucket.connection_ids:
+                self._by_connection.setdefault(connection_id, set()).add(scope)
+        self._scopes.move_to_end(scope)
+        self._next_id += 1
+        bucket.add(self._next_id, (time.monotonic() + self.ttl, self._unit(vector), value))
+        self.size += 1
+
+        while len(bucket.entries) > self.scope_maxsize:
+            self._remove_entry(scope, bucket, next(iter(bucket.entries)))
+            self.evictions += 1
+        while self.size > self.maxsize:
+            lru_scope, lru_bucket = next(iter(self._scopes.items()))
+            self._remove_entry(lru_scope, lru_bucket, next(iter(lru_bucket.entries)))
+            self.evictions += 1
+
+    def _remove_entry(self, scope: Hashable, bucket: _SemanticScope, entry_id: int) -> None:
+        bucket.remove(entry_id)
+        self.size -= 1
+        if not bucket.entries:
+            self._drop_scope(scope)
+
+    def _drop_scope(self, scope: Hashable) -> None:
+        bucket = self._scopes.pop(scope)
+        self.size -= len(bucket.entries)
+        for connection_id in bucket.connection_ids:
+            scopes = self._by_connection.get(connection_id)
+            if scopes is not None:
+                scopes.discard(scope)
+                if not scopes:
+                    del self._by_connection[connection_id]
+
+    def invalidate_connection(self, connection_id) -> None:
+        """Drop every scope that includes the connection"""
+        for scope in list(self._by_connection.get(str(connection_id), ())):
+            self._drop_scope(scope)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": self.size,
+            "maxsize": self.maxsize,
+            "scopes": len(self._scopes),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
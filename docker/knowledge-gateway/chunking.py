@@ -0,0 +1,149 @@
+"""
+Token-budgeted chunking of streamed document text.
+
+Text arrives as a stream of pieces (see ingest.extract_text) and is cut
+into sentences as it arrives; sentences are packed into chunks of at most
+CHUNK_MAX_TOKENS, and each chunk starts with up to CHUNK_OVERLAP_TOKENS of
+whole trailing sentences from the previous one, so a passage that
+straddles a boundary is still retrievable from either side. Every chunk
+carries its token count and sentence start offsets (used for snippets).
+
+Tokens are words, individual punctuation marks and individual CJK
+characters; words longer than TOKEN_MAX_CHARS count as one token per
+TOKEN_MAX_CHARS characters. For English text this is within a few percent
+of BPE tokenizers such as cl100k_base; Japanese or Chinese text and
+unbroken runs (base64, long identifiers) land close to their BPE count
+too, so the budget bounds chunk size for any script, well below the
+embedder's limit.
+"""
+
+import os
+import re
+from typing import AsyncIterator, Iterator, List, NamedTuple, Tuple
+
+from snippets import SENTENCE_END_RE
+
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", "512"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "64"))
+
+# Longest run of word characters counted as a single token
+TOKEN_MAX_CHARS = 10
+
+# Hiragana, katakana, CJK ideographs, Hangul and halfwidth katakana: no spaces between words
+CJK_CHARS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff66-\uff9f"
+TOKEN_RE = re.compile(
+    rf"[{CJK_CHARS}]|(?:(?![{CJK_CHARS}])\w){{1,{TOKEN_MAX_CHARS}}}|[^\w\s]", re.UNICODE
+)
+
+
+class Chunk(NamedTuple):
+    content: str
+    token_count: int
+    sentence_offsets: List[int]
+
+
+def count_tokens(text: str) -> int:
+    return sum(1 for _ in TOKEN_RE.finditer(text))
+
+
+def _split_long(segment: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    """Cut a sentence over the budget at token boundaries"""
+    starts = [m.start() for m in TOKEN_RE.finditer(segment)]
+    for i in range(0, len(starts), max_tokens):
+        begin = 0 if i == 0 else starts[i]
+        end = starts[i + max_tokens] if i + max_tokens < len(starts) else len(segment)
+        yield segment[begin:end], min(max_tokens, len(starts) - i)
+
+
+async def sentences(pieces: AsyncIterator[str], max_tokens: int = CHUNK_MAX_TOKENS) -> AsyncIterator[Tuple[str, int]]:
+    """
+    (segment, tokens) for each sentence in a text stream.
+
+    Segments keep their trailing whitespace, so joining them reproduces the
+    text. A sentence is only emitted once the boundary after it has been
+    seen; text without any boundary is flushed at whitespace once it grows
+    past a few chunks' worth, so pending text stays bounded.
+    """
+    pending_limit = max_tokens * 32
+    pending = ""
+    async for piece in pieces:
+        pending += piece
+        start = 0
+        for m in SENTENCE_END_RE.finditer(pending):
+            if m.end() >= len(pending):
+                break
+            for part in _segment(pending[start:m.end()], max_tokens):
+                yield part
+            start = m.end()
+        pending = pending[start:]
+        if len(pending) > pending_limit:
+            cut = pending.rfind(" ") + 1 or len(pending)
+            for part in _segment(pending[:cut], max_tokens):
+                yield part
+            pending = pending[cut:]
+    if pending:
+        for part in _segment(pending, max_tokens):
+            yield part
+
+
+def _segment(text: str, max_tokens: int) -> Iterator[Tuple[str, int]]:
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        yield text, tokens
+    else:
+        yield from _split_long(text, max_tokens)
+
+
+def validate_budget(max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> None:
+    """Checked at startup, so a bad setting stops the gateway instead of failing every file"""
+    if not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("CHUNK_OVERLAP_TOKENS must be smaller than CHUNK_MAX_TOKENS")
+
+
+def _build(segments: List[Tuple[str, int]]) -> Chunk:
+    raw = "".join(s for s, _ in segments)
+    lead = len(raw) - len(raw.lstrip())
+    content = raw.strip()
+    offsets: List[int] = []
+    position = 0
+    for segment, _ in segments:
+        offset = max(0, position - lead)
+        if offset < len(content) and (not offsets or offset != offsets[-1]):
+            offsets.append(offset)
+        position += len(segment)
+    return Chunk(content, sum(t for _, t in segments), offsets or [0])
+
+
+async def chunk_text(
+    pieces: AsyncIterator[str],
+    max_tokens: int = CHUNK_MAX_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> AsyncIterator[Chunk]:
+    """Pack a text stream's sentences into overlapping chunks of at most max_tokens"""
+    validate_budget(max_tokens, overlap_tokens)
+    window: List[Tuple[str, int]] = []
+    tokens = 0
+    fresh = False  # window holds something beyond the carried-over overlap
+    async for segment, count in sentences(pieces, max_tokens):
+        if not segment.strip():
+            if window:
+                window[-1] = (window[-1][0] + segment, window[-1][1])
+            continue
+        if tokens + count > max_tokens and fresh:
+            yield _build(window)
+            # Carry whole trailing sentences that fit the overlap budget
+            carried, carried_tokens = [], 0
+            for seg, seg_tokens in reversed(window[1:]):
+                if carried_tokens + seg_tokens > overlap_tokens:
+                    break
+                carried.insert(0, (seg, seg_tokens))
+                carried_tokens += seg_tokens
+            window, tokens, fresh = carried, carried_tokens, False
+        # Overlap gives way when the next sentence would not fit beside it
+        while window and tokens + count > max_tokens:
+            tokens -= window.pop(0)[1]
+        window.append((segment, count))
+        tokens += count
+        fresh = True
+    if fresh:
+        yield _build(window)
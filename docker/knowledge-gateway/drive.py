@@ -0,0 +1,249 @@
+"""
+Google Drive API client for connection sync.
+
+Listing follows nextPageToken with the largest page size Drive allows, and
+every call backs off on rate limiting (429, or 403 with a rate-limit
+reason) and transient 5xx / transport errors, honouring Retry-After.
+Incremental syncs read the changes feed from a stored page token instead
+of listing the whole Drive. File bodies are streamed (download, or plain
+text export for Google-native documents) so callers never hold a whole
+file in memory.
+"""
+
+import os
+import random
+import hashlib
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger("knowledge_gateway.drive")
+
+DRIVE_API = "https://www.googleapis.com/drive/v3"
+# Drive caps files.list at 1000 per page; the default of 100 means 10x the round trips
+DRIVE_PAGE_SIZE = int(os.environ.get("DRIVE_PAGE_SIZE", "1000"))
+DRIVE_MAX_RETRIES = int(os.environ.get("DRIVE_MAX_RETRIES", "8"))
+DRIVE_BACKOFF_BASE = float(os.environ.get("DRIVE_BACKOFF_BASE", "1.0"))
+DRIVE_BACKOFF_MAX = float(os.environ.get("DRIVE_BACKOFF_MAX", "64"))
+DRIVE_TIMEOUT = float(os.environ.get("DRIVE_TIMEOUT", "60"))
+# Read size for streamed file bodies; with the chunker this bounds memory per file
+DRIVE_DOWNLOAD_CHUNK_BYTES = int(os.environ.get("DRIVE_DOWNLOAD_CHUNK_BYTES", str(64 * 1024)))
+
+# Google-native documents have no stored bytes; they are exported in this format
+DRIVE_EXPORT_MIME_TYPES = {
+    "application/vnd.google-apps.document": "text/plain",
+    "application/vnd.google-apps.presentation": "text/plain",
+}
+DRIVE_FILE_QUERY = (
+    "(mimeType contains 'text/' or mimeType = 'application/pdf'"
+    + "".join(f" or mimeType = '{m}'" for m in DRIVE_EXPORT_MIME_TYPES)
+    + ") and trashed = false"
+)
+DRIVE_FILE_FIELDS = "id,name,mimeType,modifiedTime,webViewLink,md5Checksum,version"
+DRIVE_CHANGE_FIELDS = f"nextPageToken,newStartPageToken,changes(changeType,fileId,removed,file({DRIVE_FILE_FIELDS},trashed))"
+
+RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+class DriveAPIError(Exception):
+    """Non-retryable Drive response, or retries exhausted"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"Drive API error: {status_code} {detail}")
+        self.status_code = status_code
+
+
+class InvalidPageToken(DriveAPIError):
+    """The stored changes page token was rejected (expired, or from another account)"""
+
+
+def is_syncable(file: Dict[str, Any]) -> bool:
+    """Same selection as DRIVE_FILE_QUERY, for files reported by the changes feed"""
+    if file.get("trashed"):
+        return False
+    mime_type = file.get("mimeType", "")
+    return mime_type.startswith("text/") or mime_type == "application/pdf" or mime_type in DRIVE_EXPORT_MIME_TYPES
+
+
+def content_hash(file: Dict[str, Any], salt: str = "") -> str:
+    """
+    Change detector for a listed file, computed from metadata alone.
+
+    md5Checksum covers the bytes of uploaded files. Google-native documents
+    have none; their version (bumped on every change) stands in, with
+    modifiedTime as the last resort. salt identifies the ingestion pipeline,
+    so changing it reprocesses files whose content did not change.
+    """
+    if file.get("md5Checksum"):
+        basis = f"md5:{file['md5Checksum']}"
+    elif file.get("version"):
+        basis = f"version:{file['version']}"
+    else:
+        basis = f"modified:{file.get('modifiedTime', '')}"
+    return hashlib.sha256(f"{salt}|{basis}".encode()).hexdigest()[:32]
+
+
+def parse_time(value: Optional[str]) -> Optional[datetime]:
+    """Drive RFC 3339 timestamp (e.g. 2024-05-01T12:00:00.000Z) as an aware datetime"""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def is_retryable(resp: httpx.Response) -> bool:
+    if resp.status_code == 429 or resp.status_code >= 500:
+        return True
+    if resp.status_code == 403:
+        # 403 also means "no access"; only the rate-limit reasons are worth retrying
+        try:
+            errors = resp.json().get("error", {}).get("errors", [])
+        except ValueError:
+            return False
+        return any(e.get("reason") in RATE_LIMIT_REASONS for e in errors)
+    return False
+
+
+def retry_delay(attempt: int, resp: Optional[httpx.Response] = None) -> float:
+    """Retry-After when given, else truncated exponential backoff with jitter"""
+    if resp is not None:
+        retry_after = resp.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return float(retry_after)
+    return min(DRIVE_BACKOFF_MAX, DRIVE_BACKOFF_BASE * 2 ** attempt) + random.uniform(0, 1)
+
+
+class DriveClient:
+    """Authorized Drive v3 calls with retry/backoff over a shared httpx client"""
+
+    def __init__(self, access_token: str, client: httpx.AsyncClient):
+        self.client = client
+        self.headers = {"Authorization": f"Bearer {access_token}"}
+        self.requests = 0
+        self.retries = 0
+        self.bytes_downloaded = 0
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        for attempt in range(DRIVE_MAX_RETRIES + 1):
+            self.requests += 1
+            try:
+                resp = await self.client.get(
+                    f"{DRIVE_API}{path}", headers=self.headers, params=params, timeout=DRIVE_TIMEOUT
+                )
+            except httpx.TransportError as e:
+                if attempt == DRIVE_MAX_RETRIES:
+                    raise
+                delay = retry_delay(attempt)
+                logger.warning("Drive %s failed (%s), retrying in %.1fs", path, e, delay)
+            else:
+                if resp.status_code == 200:
+                    return resp
+                if not is_retryable(resp) or attempt == DRIVE_MAX_RETRIES:
+                    raise DriveAPIError(resp.status_code, resp.text[:200])
+                delay = retry_delay(attempt, resp)
+                logger.warning("Drive %s returned %d, retrying in %.1fs", path, resp.status_code, delay)
+            self.retries += 1
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    @asynccontextmanager
+    async def stream(self, path: str, params: Optional[Dict[str, Any]] = None) -> AsyncIterator[httpx.Response]:
+        """
+        Open a streaming GET; the caller reads the body from the response.
+
+        Opening is retried like get(). Once the body is being read, a
+        failure propagates: bytes already handed out cannot be replayed.
+        """
+        for attempt in range(DRIVE_MAX_RETRIES + 1):
+            self.requests += 1
+            try:
+                request = self.client.build_request(
+                    "GET", f"{DRIVE_API}{path}", headers=self.headers, params=params, timeout=DRIVE_TIMEOUT
+                )
+                resp = await self.client.send(request, stream=True)
+            except httpx.TransportError as e:
+                if attempt == DRIVE_MAX_RETRIES:
+                    raise
+                delay = retry_delay(attempt)
+                logger.warning("Drive %s failed (%s), retrying in %.1fs", path, e, delay)
+            else:
+                if resp.status_code == 200:
+                    try:
+                        yield resp
+                    finally:
+                        await resp.aclose()
+                    return
+                # Error bodies are small; is_retryable needs the JSON reason
+                await resp.aread()
+                await resp.aclose()
+                if not is_retryable(resp) or attempt == DRIVE_MAX_RETRIES:
+                    raise DriveAPIError(resp.status_code, resp.text[:200])
+                delay = retry_delay(attempt, resp)
+                logger.warning("Drive %s returned %d, retrying in %.1fs", path, resp.status_code, delay)
+            self.retries += 1
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+    async def download(self, file: Dict[str, Any]) -> AsyncIterator[bytes]:
+        """Yield a file's body in DRIVE_DOWNLOAD_CHUNK_BYTES blocks, exporting Google-native documents"""
+        export_type = DRIVE_EXPORT_MIME_TYPES.get(file.get("mimeType", ""))
+        if export_type:
+            path, params = f"/files/{file['id']}/export", {"mimeType": export_type}
+        else:
+            path, params = f"/files/{file['id']}", {"alt": "media"}
+        async with self.stream(path, params) as resp:
+            async for block in resp.aiter_bytes(DRIVE_DOWNLOAD_CHUNK_BYTES):
+                self.bytes_downloaded += len(block)
+                yield block
+
+    async def list_files(self, page_size: int = DRIVE_PAGE_SIZE) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield pages of file metadata until Drive stops returning nextPageToken"""
+        params = {
+            "q": DRIVE_FILE_QUERY,
+            "fields": f"nextPageToken,files({DRIVE_FILE_FIELDS})",
+            "pageSize": page_size,
+            "spaces": "drive",
+        }
+        while True:
+            data = (await self.get("/files", params)).json()
+            yield data.get("files", [])
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return
+            params["pageToken"] = page_token
+
+    async def get_start_page_token(self) -> str:
+        """Token for "now"; changes after this point are returned by list_changes"""
+        return (await self.get("/changes/startPageToken")).json()["startPageToken"]
+
+    async def list_changes(self, page_token: str) -> AsyncIterator[Tuple[List[Dict[str, Any]], Optional[str]]]:
+        """
+        Yield (changes, new_start_page_token) pages since page_token.
+
+        new_start_page_token is only set on the last page and is the cursor
+        for the next incremental sync. Raises InvalidPageToken if Drive
+        rejects page_token, so the caller can fall back to a full listing.
+        """
+        params = {
+            "pageToken": page_token,
+            "pageSize": DRIVE_PAGE_SIZE,
+            "includeRemoved": "true",
+            "spaces": "drive",
+            "fields": DRIVE_CHANGE_FIELDS,
+        }
+        first = True
+        while True:
+            try:
+                data = (await self.get("/changes", params)).json()
+            except DriveAPIError as e:
+                if first and e.status_code in (400, 404, 410):
+                    raise InvalidPageToken(e.status_code, "changes page token rejected") from e
+                raise
+            first = False
+            yield data.get("changes", []), data.get("newStartPageToken")
+            if not data.get("nextPageToken"):
+                return
+            params["pageToken"] = data["nextPageToken"]
@@ -0,0 +1,161 @@
+"""
+Shared, batched embedding stage for chunk ingestion.
+
+Chunkers submit texts to one bounded queue per process; EMBED_CONCURRENCY
+workers drain it into batches bounded by EMBED_BATCH_SIZE texts and
+EMBED_BATCH_TOKENS tokens and call the embedder once per batch. Batches
+mix chunks from every file being synced, so many small files still make
+full batches. When the embedder falls behind the queue fills, submit()
+blocks, and the wait propagates back through the chunker to the Drive
+download stream instead of buffering chunks in memory.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("knowledge_gateway.embedding_pipeline")
+
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "64"))
+# Most embedding APIs cap tokens per request as well as inputs
+EMBED_BATCH_TOKENS = int(os.environ.get("EMBED_BATCH_TOKENS", "32000"))
+EMBED_CONCURRENCY = int(os.environ.get("EMBED_CONCURRENCY", "4"))
+EMBED_QUEUE_SIZE = int(os.environ.get("EMBED_QUEUE_SIZE", "512"))
+# How long a worker waits for more chunks before sending a partial batch
+EMBED_BATCH_LINGER_MS = int(os.environ.get("EMBED_BATCH_LINGER_MS", "20"))
+
+# Recent batches kept for the latency and throughput figures in stats()
+STATS_WINDOW = 256
+
+# (text, token_count, future for the embedding)
+Item = Tuple[str, int, asyncio.Future]
+
+
+class EmbeddingPipeline:
+    """Bounded queue + EMBED_CONCURRENCY batch workers in front of an embedder"""
+
+    def __init__(
+        self,
+        embedder,
+        batch_size: int = EMBED_BATCH_SIZE,
+        batch_tokens: int = EMBED_BATCH_TOKENS,
+        concurrency: int = EMBED_CONCURRENCY,
+        queue_size: int = EMBED_QUEUE_SIZE,
+        linger_ms: int = EMBED_BATCH_LINGER_MS,
+    ):
+        self.embedder = embedder
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.concurrency = concurrency
+        self.linger = linger_ms / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._workers: List[asyncio.Task] = []
+        self.in_flight = 0
+        self.chunks = 0
+        self.batches = 0
+        self.failed = 0
+        # (finished monotonic time, chunks, latency seconds) per recent batch
+        self._recent: deque = deque(maxlen=STATS_WINDOW)
+
+    @property
+    def window(self) -> int:
+        """Chunks one caller may have outstanding; enough to keep every worker busy"""
+        return self.batch_size * self.concurrency
+
+    def start(self) -> None:
+        self._workers = [asyncio.create_task(self._run()) for _ in range(self.concurrency)]
+
+    async def submit(self, text: str, tokens: int) -> asyncio.Future:
+        """Queue one text; waits while the queue is full. The future resolves to its embedding."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, tokens, future))
+        return future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        carry: Optional[Item] = None
+        while True:
+            first = carry or await self.queue.get()
+            carry = None
+            batch, tokens = [first], first[1]
+            deadline = loop.time() + self.linger
+            while len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if tokens + item[1] > self.batch_tokens:
+                    # Starts this worker's next batch
+                    carry = item
+                    break
+                batch.append(item)
+                tokens += item[1]
+            await self._embed(batch)
+
+    async def _embed(self, batch: List[Item]) -> None:
+        # Submitters that gave up (failed COPY, cancelled sync) no longer need theirs
+        batch = [item for item in batch if not item[2].done()]
+        if not batch:
+            return
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            vectors = await self.embedder.embed([text for text, _, _ in batch])
+        except Exception as e:
+            self.failed += len(batch)
+            logger.warning("Embedding batch of %d chunks failed: %s", len(batch), e)
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self.in_flight -= 1
+        finished = time.perf_counter()
+        self.chunks += len(batch)
+        self.batches += 1
+        self._recent.append((finished, len(batch), finished - started))
+        for (_, _, future), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def stop(self) -> None:
+        """Stop the workers; anything still queued fails with CancelledError"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        while not self.queue.empty():
+            _, _, future = self.queue.get_nowait()
+            future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        recent = list(self._recent)
+        latencies = sorted(latency for _, _, latency in recent)
+        chunks_per_sec = None
+        if len(recent) > 1:
+            # Throughput over the recent window, so idle time between syncs does not dilute it
+            span = recent[-1][0] - (recent[0][0] - recent[0][2])
+            chunks_per_sec = round(sum(n for _, n, _ in recent) / span, 1) if span > 0 else None
+        return {
+            "queued": self.queue.qsize(),
+            "in_flight_batches": self.in_flight,
+            "chunks": self.chunks,
+            "batches": self.batches,
+            "failed": self.failed,
+            "avg_batch_size": round(self.chunks / self.batches, 1) if self.batches else None,
+            "chunks_per_sec": chunks_per_sec,
+            "batch_latency_ms": {
+                "avg": round(1000 * sum(latencies) / len(latencies), 2),
+                "p95": round(1000 * latencies[int(0.95 * (len(latencies) - 1))], 2),
+                "max": round(1000 * latencies[-1], 2),
+            } if latencies else None,
+        }
@@ -0,0 +1,227 @@
+"""
+Query/document embedders for the knowledge gateway.
+
+Embedders are pluggable: the gateway only relies on the ``Embedder``
+protocol below, and ``get_embedder`` picks an implementation from the
+``EMBEDDER`` environment variable.
+"""
+
+import os
+import re
+import math
+import struct
+import hashlib
+from typing import List, Optional, Protocol
+
+import httpx
+import numpy as np
+
+# Must match the vector(N) column in schema.sql
+EMBEDDING_DIMENSIONS = int(os.environ.get("EMBEDDING_DIMENSIONS", "1536"))
+# Reduced projection for two-stage search; must match embedding_coarse vector(N)
+COARSE_DIMENSIONS = int(os.environ.get("COARSE_DIMENSIONS", "256"))
+# random (any embedder) | truncate (Matryoshka-trained models such as text-embedding-3)
+COARSE_PROJECTION = os.environ.get("COARSE_PROJECTION", "random").strip().lower()
+COARSE_PROJECTION_SEED = 0x5EED
+
+# How knowledge_chunks keeps full embeddings: vector (float32) or halfvec
+# (float16, half the heap and index size). Switch with the migration in
+# vector_index.py (migrate-storage) before changing this on the gateway.
+EMBEDDING_STORAGE = os.environ.get("EMBEDDING_STORAGE", "vector").strip().lower()
+STORAGE_COLUMNS = {"vector": "embedding", "halfvec": "embedding_half"}
+if EMBEDDING_STORAGE not in STORAGE_COLUMNS:
+    raise RuntimeError(f"Unknown EMBEDDING_STORAGE: {EMBEDDING_STORAGE}")
+# Column searched and written in the active storage mode
+EMBEDDING_COLUMN = STORAGE_COLUMNS[EMBEDDING_STORAGE]
+# Appended to vector-typed bind parameters so they compare against EMBEDDING_COLUMN
+VECTOR_PARAM_CAST = "::vector::halfvec" if EMBEDDING_STORAGE == "halfvec" else "::vector"
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class Embedder(Protocol):
+    """Turns texts into fixed-size vectors"""
+
+    name: str
+    dimensions: int
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        ...
+
+# Local, CPU-bound embedders also provide a synchronous
+# embed_array(texts) -> float32 ndarray; the sync pipeline runs that in
+# worker processes (offload.py) instead of on the event loop.
+
+
+class HashingEmbedder:
+    """
+    Deterministic feature-hashing embedder.
+
+    Needs no network or model weights, so it works offline, in CI and as a
+    stand-in until a real model is configured. Words and character
+    trigrams are hashed into signed buckets and the result is L2-normalized,
+    so cosine distance behaves like a weighted term overlap.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+        self.name = f"hashing-v1-{dimensions}"
+
+    def _features(self, text: str) -> List[str]:
+        words = TOKEN_RE.findall(text.lower())
+        features = [f"w:{w}" for w in words]
+        for w in words:
+            padded = f"#{w}#"
+            features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return features
+
+    def embed_one(self, text: str) -> List[float]:
+        vec = [0.0] * self.dimensions
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            # Whole words carry more signal than trigrams
+            vec[bucket] += sign * (2.0 if feature[0] == "w" else 1.0)
+        norm = math.sqrt(sum(v * v for v in vec))
+        if norm == 0.0:
+            # pgvector cannot compute cosine distance for a zero vector
+            vec[0] = 1.0
+            return vec
+        return [v / norm for v in vec]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_one(t) for t in texts]
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        return np.array([self.embed_one(t) for t in texts], dtype=np.float32).reshape(len(texts), self.dimensions)
+
+
+class OpenAIEmbedder:
+    """Embedder backed by the OpenAI-compatible /v1/embeddings API"""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "text-embedding-3-small",
+        base_url: str = "https://api.openai.com/v1",
+        dimensions: int = EMBEDDING_DIMENSIONS,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        self.dimensions = dimensions
+        self.name = f"openai-{model}-{dimensions}"
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            resp = await client.post(
+                f"{self.base_url}/embeddings",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={"model": self.model, "input": texts, "dimensions": self.dimensions},
+            )
+            resp.raise_for_status()
+            data = sorted(resp.json()["data"], key=lambda d: d["index"])
+            return [d["embedding"] for d in data]
+
+
+def get_embedder(kind: Optional[str] = None) -> Embedder:
+    """Build the embedder selected by EMBEDDER (hashing | openai)"""
+    kind = (kind or os.environ.get("EMBEDDER", "hashing")).strip().lower()
+    if kind == "hashing":
+        return HashingEmbedder()
+    if kind == "openai":
+        api_key = os.environ.get("OPENAI_API_KEY", "")
+        if not api_key:
+            raise RuntimeError("EMBEDDER=openai requires OPENAI_API_KEY")
+        return OpenAIEmbedder(
+            api_key=api_key,
+            model=os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small"),
+            base_url=os.environ.get("EMBEDDING_BASE_URL", "https://api.openai.com/v1"),
+        )
+    raise RuntimeError(f"Unknown EMBEDDER: {kind}")
+
+
+class CoarseProjector:
+    """
+    Maps full embeddings to the reduced vectors stored in embedding_coarse.
+
+    random multiplies by a fixed Gaussian matrix (Johnson-Lindenstrauss), so
+    cosine similarity is approximately preserved for any embedder; the seed
+    is constant so every replica and the backfill agree. truncate keeps the
+    leading dimensions, which is what Matryoshka-trained models are built
+    for. Outputs are L2-normalized either way.
+    """
+
+    def __init__(
+        self,
+        input_dimensions: int = EMBEDDING_DIMENSIONS,
+        dimensions: int = COARSE_DIMENSIONS,
+        method: str = COARSE_PROJECTION,
+    ):
+        if method not in ("random", "truncate"):
+            raise RuntimeError(f"Unknown COARSE_PROJECTION: {method}")
+        if dimensions > input_dimensions:
+            raise RuntimeError("COARSE_DIMENSIONS must not exceed EMBEDDING_DIMENSIONS")
+        self.dimensions = dimensions
+        self.method = method
+        self.matrix = None
+        if method == "random":
+            rng = np.random.default_rng(COARSE_PROJECTION_SEED)
+            self.matrix = (rng.standard_normal((input_dimensions, dimensions)) / math.sqrt(dimensions)).astype(np.float32)
+
+    def project(self, vectors) -> np.ndarray:
+        """Project one vector or a (n, dims) batch; always returns a 2-D float32 array"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        if self.matrix is not None:
+            reduced = vectors @ self.matrix
+        else:
+            reduced = vectors[:, :self.dimensions]
+        norms = np.sqrt(np.einsum("ij,ij->i", reduced, reduced))
+        return reduced / np.maximum(norms, 1e-12)[:, None]
+
+
+def to_pgvector(vec: List[float]) -> str:
+    """Format a vector as a pgvector text literal for a $n::vector parameter"""
+    return "[" + ",".join(f"{v:.7g}" for v in vec) + "]"
+
+
+def encode_vector(value) -> bytes:
+    """pgvector binary send format: dim (int16), unused (int16), float4[] big-endian"""
+    if isinstance(value, str):
+        value = [float(v) for v in value.strip("[]").split(",")]
+    arr = np.asarray(value, dtype=">f4")
+    return struct.pack(">HH", arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=">f4", offset=4).astype(np.float32)
+
+
+def encode_halfvec(value) -> bytes:
+    """halfvec binary send format: as vector, with float2 elements"""
+    arr = np.asarray(value, dtype=">f2")
+    return struct.pack(">HH", arr.shape[0], 0) + arr.tobytes()
+
+
+def decode_halfvec(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype=">f2", offset=4).astype(np.float32)
+
+
+async def register_vector_codec(conn) -> None:
+    """
+    Exchange pgvector values in binary as NumPy arrays.
+
+    Used as the pool's init hook so embeddings fetched for reranking arrive
+    as float32 arrays without parsing text literals.
+    """
+    await conn.set_type_codec(
+        "vector", schema="public", encoder=encode_vector, decoder=decode_vector, format="binary"
+    )
+    # COPY cannot cast, so bulk chunk writes send halfvec values directly
+    try:
+        await conn.set_type_codec(
+            "halfvec", schema="public", encoder=encode_halfvec, decoder=decode_halfvec, format="binary"
+        )
+    except ValueError:
+        pass  # pgvector < 0.7 has no halfvec
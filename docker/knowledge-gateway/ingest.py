@@ -0,0 +1,134 @@
+"""
+Building blocks for the connection sync pipeline.
+
+Stages run as concurrent tasks connected by bounded asyncio queues, so
+listing and per-file processing overlap, and a slow stage applies
+backpressure upstream instead of buffering a whole Drive in memory.
+
+File bodies go through the same idea at a smaller scale: downloaded
+blocks are decoded (or, for PDFs, extracted a few pages at a time by a
+worker process) into a text stream, and chunking.chunk_text cuts chunks from it as it arrives, so
+memory per file is bounded by a block plus one chunk rather than by the
+file size.
+"""
+
+import os
+import codecs
+import asyncio
+import tempfile
+import multiprocessing
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Optional
+
+# Files listed but not yet processed; bounds memory when listing outruns processing
+SYNC_QUEUE_SIZE = int(os.environ.get("SYNC_QUEUE_SIZE", "2000"))
+# Concurrent per-file workers within one connection sync (each holds a pool connection)
+SYNC_FILE_WORKERS = int(os.environ.get("SYNC_FILE_WORKERS", "4"))
+# File bodies downloaded at once across all connection syncs in this process
+SYNC_DOWNLOAD_CONCURRENCY = int(os.environ.get("SYNC_DOWNLOAD_CONCURRENCY", "8"))
+# Pages extracted per offloaded call; bounds both the text held at once and pipe traffic
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", "16"))
+
+# End-of-stream marker; producers put one per consumer
+STOP = object()
+
+
+async def run_stages(*stages: Awaitable) -> None:
+    """Run pipeline stages together; if one fails, cancel the others and re-raise"""
+    tasks = [asyncio.ensure_future(stage) for stage in stages]
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _in_thread(fn: Callable, *args) -> Any:
+    return await asyncio.to_thread(fn, *args)
+
+
+async def extract_text(
+    mime_type: str, blocks: AsyncIterator[bytes], run: Callable[..., Awaitable] = _in_thread
+) -> AsyncIterator[str]:
+    """
+    Text of a file body as a stream of pieces, decoded as the blocks arrive.
+
+    run(fn, *args) executes CPU-bound extraction off the event loop
+    (ProcessOffload.run in the gateway; a thread by default).
+    """
+    if mime_type == "application/pdf":
+        async for page in _pdf_pages(blocks, run):
+            yield page
+        return
+    # utf-8-sig drops a leading BOM; undecodable bytes become U+FFFD instead of failing the file
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    async for block in blocks:
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def _pdf_pages(blocks: AsyncIterator[bytes], run: Callable[..., Awaitable]) -> AsyncIterator[str]:
+    """
+    Spool a PDF body to a temporary file, then extract it in page ranges.
+
+    PDFs need random access (the xref table sits at the end), and a file
+    path is something a worker process can open on its own.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as spool:
+        async for block in blocks:
+            spool.write(block)
+        spool.flush()
+        pages = await run(pdf_page_count, spool.name)
+        for start in range(0, pages, PDF_PAGES_PER_TASK):
+            for text in await run(pdf_page_texts, spool.name, start, start + PDF_PAGES_PER_TASK):
+                if text:
+                    yield text + "\n"
+
+
+# Parsed reader cached in a pool worker process, so consecutive page ranges
+# of one PDF parse it once. A worker runs one task at a time; threads of
+# the gateway process extract concurrently and open their own reader.
+_pdf_reader: Optional[tuple] = None
+
+
+def _cached_pdf(path: str):
+    global _pdf_reader
+    from pypdf import PdfReader
+
+    st = os.stat(path)
+    key = (path, st.st_ino, st.st_size, st.st_mtime_ns)
+    if _pdf_reader is None or _pdf_reader[0] != key:
+        if _pdf_reader is not None:
+            _pdf_reader[2].close()
+        # Given a path PdfReader would read the whole file into memory; given
+        # a file it parses objects lazily, so only touched pages are loaded
+        fh = open(path, "rb")
+        _pdf_reader = (key, PdfReader(fh), fh)
+    return _pdf_reader[1]
+
+
+@contextmanager
+def _open_pdf(path: str) -> Iterator[Any]:
+    if multiprocessing.parent_process() is not None:
+        yield _cached_pdf(path)
+        return
+    from pypdf import PdfReader
+
+    with open(path, "rb") as fh:
+        yield PdfReader(fh)
+
+
+def pdf_page_count(path: str) -> int:
+    with _open_pdf(path) as reader:
+        return len(reader.pages)
+
+
+def pdf_page_texts(path: str, start: int, stop: int) -> List[str]:
+    with _open_pdf(path) as reader:
+        return [reader.pages[i].extract_text() or "" for i in range(start, min(stop, len(reader.pages)))]
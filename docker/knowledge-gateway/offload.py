@@ -0,0 +1,142 @@
+"""
+Process pool for CPU-bound ingestion work.
+
+A local embedding model or PDF text extraction holds the GIL for as long
+as it runs, so doing either on the event loop (or in a thread) stalls
+/knowledge/search while a sync is in progress. INGEST_PROCESSES worker
+processes take that work instead. Embedding results come back through
+shared memory: the gateway allocates a block for the (texts x dims)
+float32 matrix, the worker writes into it, and only the block name and
+a status cross the pipe rather than a pickled list of floats.
+
+With INGEST_PROCESSES=0 the same functions run in threads of this
+process, as before.
+"""
+
+import os
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from embeddings import get_embedder
+
+logger = logging.getLogger("knowledge_gateway.offload")
+
+INGEST_PROCESSES = int(os.environ.get("INGEST_PROCESSES", str(min(4, max(1, (os.cpu_count() or 2) - 1)))))
+
+# Built once per worker process from the same environment as the gateway
+_worker_embedder = None
+
+
+def _embed_into(embedder_name: str, texts: List[str], shm_name: str) -> None:
+    """Worker side: embed texts into the caller's shared-memory matrix"""
+    global _worker_embedder
+    if _worker_embedder is None:
+        _worker_embedder = get_embedder()
+    if _worker_embedder.name != embedder_name:
+        raise RuntimeError(f"Worker embedder {_worker_embedder.name} does not match {embedder_name}")
+    vectors = _worker_embedder.embed_array(texts)
+    shm = SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(vectors.shape, dtype=np.float32, buffer=shm.buf)
+        out[:] = vectors
+        del out
+    finally:
+        shm.close()
+
+
+class ProcessOffload:
+    """Runs ingestion callables in a ProcessPoolExecutor, or in threads when processes=0"""
+
+    def __init__(self, processes: int = INGEST_PROCESSES):
+        self.processes = processes
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.tasks = 0
+        self.running = 0
+        self.restarts = 0
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn: forking a process that runs an event loop and a DB pool is not safe
+        return ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+
+    def start(self) -> None:
+        if self.processes > 0:
+            self.executor = self._new_executor()
+
+    def _replace(self, broken: ProcessPoolExecutor) -> None:
+        """Swap in a fresh pool, once, for every caller that saw the same broken one"""
+        if self.executor is not broken:
+            return
+        logger.warning("Ingest process pool broke (a worker died); starting a new one")
+        self.restarts += 1
+        self.executor = self._new_executor()
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    async def stop(self) -> None:
+        if self.executor is not None:
+            executor, self.executor = self.executor, None
+            await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """Call a picklable top-level function off the event loop"""
+        self.tasks += 1
+        self.running += 1
+        try:
+            if self.executor is None:
+                return await asyncio.to_thread(fn, *args)
+            loop = asyncio.get_running_loop()
+            executor = self.executor
+            try:
+                return await loop.run_in_executor(executor, fn, *args)
+            except BrokenProcessPool:
+                # A killed worker (OOM, a crashing parser) breaks the whole pool; retry once on a new one
+                self._replace(executor)
+                if self.executor is None:
+                    raise
+                return await loop.run_in_executor(self.executor, fn, *args)
+        finally:
+            self.running -= 1
+
+    async def embed(self, embedder, texts: List[str]) -> np.ndarray:
+        """(len(texts), dims) float32 embeddings from a local embedder's embed_array"""
+        if self.executor is None:
+            return await self.run(embedder.embed_array, texts)
+        shm = SharedMemory(create=True, size=max(1, len(texts) * embedder.dimensions * 4))
+        try:
+            await self.run(_embed_into, embedder.name, texts, shm.name)
+            view = np.ndarray((len(texts), embedder.dimensions), dtype=np.float32, buffer=shm.buf)
+            result = view.copy()
+            del view
+            return result
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"processes": self.processes, "tasks": self.tasks, "running": self.running, "restarts": self.restarts}
+
+
+class OffloadedEmbedder:
+    """
+    Embedder facade for the ingestion pipeline.
+
+    Local embedders (those with a synchronous embed_array) run in the
+    process pool; remote ones are I/O-bound and are awaited directly.
+    """
+
+    def __init__(self, embedder, offload: ProcessOffload):
+        self.embedder = embedder
+        self.offload = offload
+        self.name = embedder.name
+        self.dimensions = embedder.dimensions
+
+    async def embed(self, texts: List[str]):
+        if hasattr(self.embedder, "embed_array"):
+            return await self.offload.embed(self.embedder, texts)
+        return await self.embedder.embed(texts)
@@ -1,5 +1,5 @@
 -- Step 1: Neon schema for guest knowledge connector v1
--- Requires: CREATE EXTENSION privileges for vector + pgcrypto
+-- Requires: CREATE EXTENSION privileges for vector (pgvector >= 0.7 for halfvec) + pgcrypto
 
 CREATE EXTENSION IF NOT EXISTS vector;
 CREATE EXTENSION IF NOT EXISTS pgcrypto;
@@ -10,6 +10,7 @@ CREATE TABLE IF NOT EXISTS knowledge_connections (
   provider text NOT NULL CHECK (provider IN ('google_drive','onedrive')),
   provider_user_id text NOT NULL,
   status text NOT NULL DEFAULT 'active' CHECK (status IN ('active','paused','revoked','error')),
+  generation bigint NOT NULL DEFAULT 0,
   created_at timestamptz NOT NULL DEFAULT now(),
   updated_at timestamptz NOT NULL DEFAULT now(),
   UNIQUE (guest_id, provider, provider_user_id)
@@ -45,20 +46,86 @@ CREATE TABLE IF NOT EXISTS knowledge_chunks (
   chunk_index integer NOT NULL,
   content text NOT NULL,
   token_count integer NOT NULL DEFAULT 0,
-  embedding vector(1536) NOT NULL,
+  embedding vector(1536),
+  embedding_half halfvec(1536),
+  content_tsv tsvector GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED,
+  sentence_offsets integer[],
+  embedding_coarse vector(256),
   created_at timestamptz NOT NULL DEFAULT now(),
   UNIQUE (source_id, chunk_index)
 );
 
+-- Added after v1; keeps existing databases in step with the tables above
+-- Bumped whenever a connection's indexed data changes (search result cache key)
+ALTER TABLE knowledge_connections
+  ADD COLUMN IF NOT EXISTS generation bigint NOT NULL DEFAULT 0;
+
+ALTER TABLE knowledge_chunks
+  ADD COLUMN IF NOT EXISTS content_tsv tsvector
+  GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED;
+
+-- Sentence start offsets recorded at chunking time (query-focused snippets)
+ALTER TABLE knowledge_chunks
+  ADD COLUMN IF NOT EXISTS sentence_offsets integer[];
+
+-- Float16 copy of the embedding for EMBEDDING_STORAGE=halfvec (half the bytes
+-- per row and per index entry). Only the active storage column is written,
+-- so embedding may be NULL; python vector_index.py migrate-storage converts
+-- existing rows and builds idx_chunks_embedding_half.
+ALTER TABLE knowledge_chunks
+  ADD COLUMN IF NOT EXISTS embedding_half halfvec(1536);
+
+ALTER TABLE knowledge_chunks
+  ALTER COLUMN embedding DROP NOT NULL;
+
+-- Reduced projection of embedding for two-stage search (COARSE_DIMENSIONS);
+-- fill existing rows with: python vector_index.py backfill-coarse
+ALTER TABLE knowledge_chunks
+  ADD COLUMN IF NOT EXISTS embedding_coarse vector(256);
+
 CREATE TABLE IF NOT EXISTS sync_cursors (
   connection_id uuid PRIMARY KEY REFERENCES knowledge_connections(id) ON DELETE CASCADE,
   provider_cursor text,
   last_sync_at timestamptz,
   last_status text,
   last_error text,
+  last_stats jsonb,
   updated_at timestamptz NOT NULL DEFAULT now()
 );
 
+-- Per-sync file counts (listed, changes, processed, skipped, removed) of the last success
+ALTER TABLE sync_cursors ADD COLUMN IF NOT EXISTS last_stats jsonb;
+
+-- Durable sync queue (sync_jobs.py). Workers claim queued jobs with
+-- FOR UPDATE SKIP LOCKED and hold a lease renewed by heartbeats.
+CREATE TABLE IF NOT EXISTS sync_jobs (
+  id bigserial PRIMARY KEY,
+  connection_id uuid NOT NULL REFERENCES knowledge_connections(id) ON DELETE CASCADE,
+  full_resync boolean NOT NULL DEFAULT false,
+  status text NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'running', 'succeeded', 'failed')),
+  attempts integer NOT NULL DEFAULT 0,
+  -- Triggers coalesced into this job
+  requests integer NOT NULL DEFAULT 1,
+  run_after timestamptz NOT NULL DEFAULT now(),
+  lease_owner text,
+  lease_expires_at timestamptz,
+  last_error text,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  started_at timestamptz,
+  finished_at timestamptz,
+  updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+-- One queued job per connection (later triggers merge into it) and one running
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_queued_connection
+  ON sync_jobs (connection_id) WHERE status = 'queued';
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_jobs_running_connection
+  ON sync_jobs (connection_id) WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_claim
+  ON sync_jobs (run_after, id) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_sync_jobs_connection
+  ON sync_jobs (connection_id, id DESC);
+
 CREATE TABLE IF NOT EXISTS knowledge_access_logs (
   id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
   request_id text NOT NULL,
@@ -66,15 +133,56 @@ CREATE TABLE IF NOT EXISTS knowledge_access_logs (
   query text NOT NULL,
   source_ids uuid[] NOT NULL DEFAULT '{}',
   result_count integer NOT NULL DEFAULT 0,
+  quality text,
+  latency_ms real,
+  cached boolean,
   created_at timestamptz NOT NULL DEFAULT now()
 );
 
+-- Search quality tier and latency per request, for per-caller tuning
+ALTER TABLE knowledge_access_logs ADD COLUMN IF NOT EXISTS quality text;
+ALTER TABLE knowledge_access_logs ADD COLUMN IF NOT EXISTS latency_ms real;
+ALTER TABLE knowledge_access_logs ADD COLUMN IF NOT EXISTS cached boolean;
+
+-- Optional shared tier of the gateway's query-embedding cache
+CREATE TABLE IF NOT EXISTS query_embedding_cache (
+  embedder text NOT NULL,
+  query_norm text NOT NULL,
+  embedding real[] NOT NULL,
+  created_at timestamptz NOT NULL DEFAULT now(),
+  PRIMARY KEY (embedder, query_norm)
+);
+
+-- Expired rows are purged in batches by the gateway (cache.QueryEmbeddingCache)
+CREATE INDEX IF NOT EXISTS idx_query_embedding_cache_created
+  ON query_embedding_cache(created_at);
+
 CREATE INDEX IF NOT EXISTS idx_connections_guest ON knowledge_connections(guest_id);
 CREATE INDEX IF NOT EXISTS idx_sources_connection ON knowledge_sources(connection_id);
+-- Search metadata filters (SearchRequest.filters). These serve the lexical leg and
+-- planner estimates; the ANN indexes below cannot apply connection or metadata
+-- filters, so vector legs rely on pgvector's iterative scan (>= 0.8) to keep
+-- reading the index until enough rows pass them (SEARCH_ITERATIVE_SCAN).
+CREATE INDEX IF NOT EXISTS idx_sources_connection_mime ON knowledge_sources(connection_id, mime_type);
+CREATE INDEX IF NOT EXISTS idx_sources_connection_modified ON knowledge_sources(connection_id, provider_updated_at);
 CREATE INDEX IF NOT EXISTS idx_logs_guest_time ON knowledge_access_logs(guest_id, created_at DESC);
 
 -- Vector index (cosine distance)
+-- Built on an empty table here; resize or switch to HNSW as the corpus grows with
+-- POST /knowledge/admin/vector-index/rebuild (or: python vector_index.py rebuild)
 CREATE INDEX IF NOT EXISTS idx_chunks_embedding_cosine
   ON knowledge_chunks
   USING ivfflat (embedding vector_cosine_ops)
   WITH (lists = 100);
+
+-- Prefilter index for two-stage search: a 256-dim graph is several times
+-- cheaper to traverse than the full one; candidates are reranked exactly
+CREATE INDEX IF NOT EXISTS idx_chunks_embedding_coarse
+  ON knowledge_chunks
+  USING hnsw (embedding_coarse vector_cosine_ops);
+
+-- Full-text index for the lexical leg of hybrid search.
+-- 'simple' config keeps identifiers (ticket numbers, SKUs) unstemmed.
+CREATE INDEX IF NOT EXISTS idx_chunks_content_tsv
+  ON knowledge_chunks
+  USING gin (content_tsv);
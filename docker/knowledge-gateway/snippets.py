@@ -0,0 +1,92 @@
+"""
+Query-focused snippet extraction.
+
+Chunks store their sentence start offsets at chunking time
+(knowledge_chunks.sentence_offsets), so picking the best passage for a
+query is one regex pass for term hits plus a two-pointer sweep over
+sentences, with no re-segmentation of the chunk per request.
+"""
+
+import re
+from bisect import bisect_left
+from typing import List, Optional, Sequence, Tuple
+
+SNIPPET_MAX_CHARS = 500
+
+# Sentence ends: Latin and CJK terminal punctuation followed by space, or line breaks
+SENTENCE_END_RE = re.compile(r"(?<=[.!?。！？])\s+|(?<=[。！？])|\n+")
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def sentence_offsets(text: str) -> List[int]:
+    """Start offset of every sentence in text (always begins with 0)"""
+    offsets = [0]
+    for m in SENTENCE_END_RE.finditer(text):
+        if 0 < m.end() < len(text) and m.end() != offsets[-1]:
+            offsets.append(m.end())
+    return offsets
+
+
+def query_pattern(query: str) -> Optional[re.Pattern]:
+    """Case-insensitive alternation of the query's distinct terms"""
+    terms = sorted({t for t in TERM_RE.findall(query.lower()) if len(t) > 1}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile(r"\b(?:" + "|".join(re.escape(t) for t in terms) + r")\b", re.IGNORECASE)
+
+
+def extract_snippet(
+    content: str,
+    offsets: Optional[Sequence[int]],
+    pattern: Optional[re.Pattern],
+    max_chars: int = SNIPPET_MAX_CHARS,
+) -> Tuple[str, int, List[Tuple[int, int]]]:
+    """
+    Best window of whole sentences for the query.
+
+    Returns (snippet, start offset in content, match spans relative to the
+    snippet). Windows are scored by distinct query terms first and total
+    hits second; without any hit the chunk head is returned, as before.
+    """
+    if pattern is None:
+        return content[:max_chars], 0, []
+
+    matches = [(m.start(), m.end(), m.group(0).lower()) for m in pattern.finditer(content)]
+    if not matches:
+        return content[:max_chars], 0, []
+    if len(content) <= max_chars:
+        return content, 0, [(s, e) for s, e, _ in matches]
+
+    starts = list(offsets) if offsets else sentence_offsets(content)
+    bounds = starts + [len(content)]
+    match_starts = [s for s, _, _ in matches]
+
+    best = None
+    right = 0
+    for left in range(len(starts)):
+        right = max(right, left)
+        # Grow the window while the next sentence still fits
+        while right + 1 < len(starts) and bounds[right + 2] - bounds[left] <= max_chars:
+            right += 1
+        lo = bisect_left(match_starts, bounds[left])
+        hi = bisect_left(match_starts, bounds[right + 1])
+        if lo == hi:
+            continue
+        # Ties go to the window that opens closest to its first hit
+        score = (len({matches[i][2] for i in range(lo, hi)}), hi - lo, bounds[left] - match_starts[lo])
+        if best is None or score > best[0]:
+            best = (score, bounds[left], bounds[right + 1], lo)
+
+    if best is None:
+        return content[:max_chars], 0, []
+    _, start, end, first = best
+    if end - start > max_chars:
+        # A single sentence longer than the budget: centre on its first hit
+        hit = matches[first][0]
+        start = max(start, min(hit - max_chars // 3, end - max_chars))
+        end = start + max_chars
+
+    snippet = content[start:end].rstrip()
+    end = start + len(snippet)
+    spans = [(s - start, e - start) for s, e, _ in matches if s >= start and e <= end]
+    return snippet, start, spans
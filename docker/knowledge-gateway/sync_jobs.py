@@ -0,0 +1,321 @@
+"""
+Durable connection sync queue (sync_jobs table).
+
+/knowledge/sync/run only inserts a job; workers claim jobs with
+SELECT ... FOR UPDATE SKIP LOCKED, so any number of worker processes or
+containers can share the queue without handing out a job twice.
+
+- Coalescing: a connection has at most one queued job (partial unique
+  index). Further triggers merge into it (full_resync is OR-ed) instead
+  of queueing duplicate work. A trigger that arrives while a sync is
+  running queues one follow-up job, which waits for the running one.
+- Leases: a claimed job is leased for SYNC_JOB_LEASE_SECONDS and the
+  worker renews it every SYNC_JOB_HEARTBEAT_SECONDS. A job whose lease
+  ran out (worker crashed or lost its database connection) is requeued
+  by the next worker that looks for work.
+- Concurrency: SYNC_WORKER_CONCURRENCY jobs per worker process, and at
+  most SYNC_MAX_RUNNING running jobs across all workers.
+
+The gateway runs a worker in-process unless SYNC_WORKER_CONCURRENCY=0;
+more workers run as separate processes or containers from the same
+image:
+
+    python sync_jobs.py
+"""
+
+import os
+import sys
+import uuid
+import random
+import socket
+import signal
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import asyncpg
+
+logger = logging.getLogger("knowledge_gateway.sync_jobs")
+
+# Jobs this process runs at once (0 = enqueue only, run no worker here)
+SYNC_WORKER_CONCURRENCY = int(os.environ.get("SYNC_WORKER_CONCURRENCY", "2"))
+# Running jobs across every worker process
+SYNC_MAX_RUNNING = int(os.environ.get("SYNC_MAX_RUNNING", "8"))
+SYNC_JOB_LEASE_SECONDS = int(os.environ.get("SYNC_JOB_LEASE_SECONDS", "120"))
+SYNC_JOB_HEARTBEAT_SECONDS = int(os.environ.get("SYNC_JOB_HEARTBEAT_SECONDS", "30"))
+SYNC_JOB_MAX_ATTEMPTS = int(os.environ.get("SYNC_JOB_MAX_ATTEMPTS", "3"))
+SYNC_JOB_RETRY_BASE_SECONDS = int(os.environ.get("SYNC_JOB_RETRY_BASE_SECONDS", "60"))
+# Fallback poll interval; new jobs normally wake workers through NOTIFY
+SYNC_JOB_POLL_SECONDS = float(os.environ.get("SYNC_JOB_POLL_SECONDS", "5"))
+
+NOTIFY_CHANNEL = "sync_jobs"
+# Serializes claims so the SYNC_MAX_RUNNING count cannot be raced past
+CLAIM_LOCK_KEY = 0x53594E43
+
+# Queue a job, or merge into the connection's queued one
+ENQUEUE_SQL = """
+    INSERT INTO sync_jobs (connection_id, full_resync, attempts, run_after)
+    VALUES ($1, $2, $3, now() + $4 * interval '1 second')
+    ON CONFLICT (connection_id) WHERE status = 'queued'
+    DO UPDATE SET full_resync = sync_jobs.full_resync OR EXCLUDED.full_resync,
+        attempts = GREATEST(sync_jobs.attempts, EXCLUDED.attempts),
+        requests = sync_jobs.requests + 1,
+        run_after = LEAST(sync_jobs.run_after, EXCLUDED.run_after),
+        updated_at = now()
+    RETURNING id, requests > 1 AS coalesced
+"""
+
+# Expired leases: close the job and queue a retry (merged into any queued job)
+REAP_SQL = """
+    WITH expired AS (
+        UPDATE sync_jobs
+        SET status = 'failed', last_error = 'lease expired', lease_owner = NULL,
+            finished_at = now(), updated_at = now()
+        WHERE status = 'running' AND lease_expires_at < now()
+        RETURNING connection_id, full_resync, attempts
+    )
+    INSERT INTO sync_jobs (connection_id, full_resync, attempts)
+    SELECT connection_id, full_resync, attempts FROM expired WHERE attempts < $1
+    ON CONFLICT (connection_id) WHERE status = 'queued'
+    DO UPDATE SET full_resync = sync_jobs.full_resync OR EXCLUDED.full_resync,
+        attempts = GREATEST(sync_jobs.attempts, EXCLUDED.attempts),
+        updated_at = now()
+"""
+
+CLAIM_SQL = """
+    WITH next AS (
+        SELECT j.id
+        FROM sync_jobs j
+        WHERE j.status = 'queued' AND j.run_after <= now()
+          AND NOT EXISTS (
+              SELECT 1 FROM sync_jobs r WHERE r.connection_id = j.connection_id AND r.status = 'running'
+          )
+          AND (SELECT count(*) FROM sync_jobs WHERE status = 'running') < $3
+        ORDER BY j.run_after, j.id
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE sync_jobs j
+    SET status = 'running', lease_owner = $1, lease_expires_at = now() + $2 * interval '1 second',
+        attempts = j.attempts + 1, started_at = now(), updated_at = now()
+    FROM next
+    WHERE j.id = next.id
+    RETURNING j.id, j.connection_id, j.full_resync, j.attempts
+"""
+
+
+async def enqueue(conn, connection_id, full_resync: bool = False) -> Dict[str, Any]:
+    """Queue a sync for a connection; returns the job id and whether it merged into a queued one"""
+    row = await conn.fetchrow(ENQUEUE_SQL, connection_id, full_resync, 0, 0)
+    await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, str(connection_id))
+    return {"job_id": row["id"], "coalesced": row["coalesced"]}
+
+
+async def latest_job(conn, connection_id) -> Optional[Dict[str, Any]]:
+    row = await conn.fetchrow(
+        """
+        SELECT id, status, full_resync, attempts, requests, last_error, created_at, started_at, finished_at
+        FROM sync_jobs WHERE connection_id = $1
+        ORDER BY id DESC LIMIT 1
+        """,
+        connection_id
+    )
+    if not row:
+        return None
+    job = dict(row)
+    for key in ("created_at", "started_at", "finished_at"):
+        job[key] = job[key].isoformat() if job[key] else None
+    return job
+
+
+class SyncWorker:
+    """
+    Claims sync_jobs and runs them with run_job(connection_id, full_resync) -> bool.
+
+    run_job returns False (or raises) for a failed sync; the job is retried
+    with exponential backoff up to SYNC_JOB_MAX_ATTEMPTS.
+    """
+
+    def __init__(
+        self,
+        pool,
+        dsn: str,
+        run_job: Callable[..., Awaitable[bool]],
+        concurrency: int = SYNC_WORKER_CONCURRENCY,
+        max_running: int = SYNC_MAX_RUNNING,
+    ):
+        self.pool = pool
+        self.dsn = dsn
+        self.run_job = run_job
+        self.concurrency = concurrency
+        self.max_running = max_running
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._listener = None
+        self.claimed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.leases_lost = 0
+
+    async def start(self) -> None:
+        # Outside the pool: LISTEN holds its connection for the worker's lifetime.
+        # If it drops, workers still find jobs every SYNC_JOB_POLL_SECONDS.
+        self._listener = await asyncpg.connect(self.dsn)
+        await self._listener.add_listener(NOTIFY_CHANNEL, self._notified)
+        self._task = asyncio.create_task(self._run())
+
+    def _notified(self, *args) -> None:
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        """Stop claiming and cancel running jobs; their leases lapse and another worker retries them"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._running):
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            try:
+                while len(self._running) < self.concurrency and (job := await self._claim()):
+                    task = asyncio.create_task(self._execute(job))
+                    self._running.add(task)
+                    task.add_done_callback(self._finished)
+            except Exception:
+                logger.exception("Claiming sync jobs failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), SYNC_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _finished(self, task: asyncio.Task) -> None:
+        self._running.discard(task)
+        # A slot opened up
+        self._wakeup.set()
+
+    async def _claim(self):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                await conn.execute("SELECT pg_advisory_xact_lock($1)", CLAIM_LOCK_KEY)
+                await conn.execute(REAP_SQL, SYNC_JOB_MAX_ATTEMPTS)
+                job = await conn.fetchrow(CLAIM_SQL, self.owner, SYNC_JOB_LEASE_SECONDS, self.max_running)
+        if job:
+            self.claimed += 1
+        return job
+
+    async def _heartbeat(self, job_id) -> None:
+        """Renew the lease until cancelled; returns (ending the job) only once the lease is lost"""
+        while True:
+            await asyncio.sleep(SYNC_JOB_HEARTBEAT_SECONDS)
+            try:
+                async with self.pool.acquire() as conn:
+                    renewed = await conn.fetchval(
+                        """
+                        UPDATE sync_jobs SET lease_expires_at = now() + $3 * interval '1 second', updated_at = now()
+                        WHERE id = $1 AND lease_owner = $2 AND status = 'running'
+                        RETURNING id
+                        """,
+                        job_id, self.owner, SYNC_JOB_LEASE_SECONDS
+                    )
+            except Exception as e:
+                # The lease outlasts several heartbeats; a blip is not worth abandoning the sync
+                logger.warning("Heartbeat for sync job %s failed: %s", job_id, e)
+                continue
+            if renewed is None:
+                return
+
+    async def _execute(self, job) -> None:
+        job_id, connection_id = job["id"], str(job["connection_id"])
+        error = None
+        sync = asyncio.create_task(self.run_job(connection_id, job["full_resync"]))
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        try:
+            done, _ = await asyncio.wait({sync, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if heartbeat in done:
+                # Someone else owns the job now; stop writing on its behalf
+                sync.cancel()
+                await asyncio.gather(sync, return_exceptions=True)
+                self.leases_lost += 1
+                logger.warning("Lost the lease on sync job %s (connection %s)", job_id, connection_id)
+                return
+            ok = sync.result()
+            if not ok:
+                error = "sync failed"
+        except asyncio.CancelledError:
+            sync.cancel()
+            raise
+        except Exception as e:
+            error = str(e)
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+        try:
+            await self._complete(job, error)
+        except Exception:
+            # The lease lapses and the job is retried, which is safe: syncs are idempotent
+            logger.exception("Could not record the outcome of sync job %s", job_id)
+
+    async def _complete(self, job, error: Optional[str]) -> None:
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                closed = await conn.fetchval(
+                    """
+                    UPDATE sync_jobs
+                    SET status = $3, last_error = $4, lease_owner = NULL, finished_at = now(), updated_at = now()
+                    WHERE id = $1 AND lease_owner = $2
+                    RETURNING id
+                    """,
+                    job["id"], self.owner, "failed" if error else "succeeded", error
+                )
+                if closed is not None and error and job["attempts"] < SYNC_JOB_MAX_ATTEMPTS:
+                    delay = SYNC_JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1) * random.uniform(1.0, 1.5)
+                    await conn.fetchrow(ENQUEUE_SQL, job["connection_id"], job["full_resync"], job["attempts"], delay)
+                # A follow-up job for this connection, or one held back by SYNC_MAX_RUNNING, can start now
+                await conn.execute("SELECT pg_notify($1, $2)", NOTIFY_CHANNEL, str(job["connection_id"]))
+        if error:
+            self.failed += 1
+            logger.warning("Sync job %s (attempt %d) failed: %s", job["id"], job["attempts"], error)
+        else:
+            self.succeeded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "concurrency": self.concurrency,
+            "max_running": self.max_running,
+            "running": len(self._running),
+            "claimed": self.claimed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "leases_lost": self.leases_lost,
+        }
+
+
+async def _main() -> int:
+    """Standalone worker: the gateway's app lifespan without the HTTP server"""
+    logging.basicConfig(level=logging.INFO)
+    if SYNC_WORKER_CONCURRENCY <= 0:
+        print("SYNC_WORKER_CONCURRENCY must be positive for a worker process", file=sys.stderr)
+        return 1
+    import main
+
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+    async with main.lifespan(main.app):
+        await stopping.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
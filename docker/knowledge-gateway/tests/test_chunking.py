@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from chunking import chunk_text, count_tokens
+
+
+async def _pieces(*pieces):
+    for piece in pieces:
+        yield piece
+
+
+def chunks(*pieces, max_tokens=512, overlap_tokens=64):
+    async def collect():
+        return [c async for c in chunk_text(_pieces(*pieces), max_tokens, overlap_tokens)]
+    return asyncio.run(collect())
+
+
+def test_count_tokens_words_and_punctuation():
+    assert count_tokens("The quick brown fox, jumped.") == 7
+
+
+def test_count_tokens_cjk_characters_are_single_tokens():
+    assert count_tokens("日本語の文章です。") == 9
+
+
+def test_count_tokens_splits_long_runs():
+    assert count_tokens("a" * 100) == 10
+
+
+def test_chunks_respect_budget_and_overlap():
+    text = " ".join(f"Sentence number {i} is here." for i in range(200))
+    result = chunks(text, max_tokens=50, overlap_tokens=10)
+    assert len(result) > 1
+    for chunk in result:
+        assert chunk.token_count <= 50
+        assert chunk.token_count == count_tokens(chunk.content)
+    # Each chunk after the first opens with the previous one's last sentence
+    assert result[1].content.startswith(result[0].content.rsplit(". ", 1)[-1])
+
+
+def test_japanese_prose_is_bounded_in_characters():
+    text = "これは日本語の文章です。検索のためにチャンクに分割されます。" * 400
+    for chunk in chunks(text):
+        assert chunk.token_count <= 512
+        assert len(chunk.content) <= 512
+
+
+def test_unbroken_text_is_hard_split():
+    text = "a" * 100_000
+    result = chunks(text)
+    assert "".join(c.content for c in result) == text
+    for chunk in result:
+        assert chunk.token_count <= 512
+        assert chunk.token_count == count_tokens(chunk.content)
+
+
+def test_streamed_pieces_match_whole_text():
+    text = "First sentence here. Second one follows! A third? " * 50
+    whole = chunks(text, max_tokens=40, overlap_tokens=8)
+    streamed = chunks(*[text[i:i + 7] for i in range(0, len(text), 7)], max_tokens=40, overlap_tokens=8)
+    assert [c.content for c in streamed] == [c.content for c in whole]
+
+
+def test_sentence_offsets_point_at_sentence_starts():
+    (chunk,) = chunks("One here. Two here. Three here.")
+    assert chunk.sentence_offsets == [0, 10, 20]
+    assert [chunk.content[o] for o in chunk.sentence_offsets] == ["O", "T", "T"]
+
+
+def test_overlap_must_be_below_budget():
+    with pytest.raises(ValueError):
+        chunks("text", max_tokens=10, overlap_tokens=10)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from ranking import identifier_terms, mmr_select, reciprocal_rank_fusion, to_or_tsquery
+
+
+def test_or_tsquery_drops_stopwords_and_single_characters():
+    assert to_or_tsquery("what's our refund policy") == "refund | policy"
+
+
+def test_or_tsquery_keeps_identifiers_and_dedupes():
+    assert to_or_tsquery("INC-10233 status of INC-10233") == "inc | 10233 | status"
+
+
+def test_or_tsquery_without_indexable_terms():
+    assert to_or_tsquery("what is it?") is None
+    assert to_or_tsquery("") is None
+
+
+def test_identifier_terms():
+    assert identifier_terms("Is INC-10234 fixed in v2?") == ("10234", "v2")
+    assert identifier_terms("refund policy") == ()
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"]], limit=3)
+    assert [item for item, _ in fused][:2] in (["a", "b"], ["b", "a"])
+    assert len(fused) == 3
+    assert fused[0][1] >= fused[1][1] >= fused[2][1]
+
+
+def test_mmr_select_prefers_novel_candidates():
+    vectors = np.array([[1.0, 0.0], [0.99, 0.01], [0.0, 1.0]], dtype=np.float32)
+    relevance = np.array([1.0, 0.95, 0.8], dtype=np.float32)
+    assert mmr_select(vectors, relevance, 2, lambda_=0.5) == [0, 2]
+    assert mmr_select(vectors[:0], relevance[:0], 2) == []